@@ -3,7 +3,10 @@
 Debug script for API authentication issues in the MCP API Registry.
 
 Usage:
-    python debug_api_auth.py <api_id> <warehouse_id> <catalog> <schema>
+    python debug_api_auth.py <api_id> <warehouse_id> <catalog> <schema> [--profile NAME]
+        [--diagnose] [--cache] [--verbose]
+    python debug_api_auth.py --ids-file ids.txt <warehouse_id> <catalog> <schema> [--profile NAME]
+    python debug_api_auth.py --all <warehouse_id> <catalog> <schema> [--profile NAME]
 
 This script will:
 1. Check if the API exists in the registry
@@ -11,225 +14,757 @@ This script will:
 3. Check if secrets are properly configured
 4. Test the connection
 5. Attempt a test API call
+
+With --ids-file, every api_id in the file (one per line) is checked with a
+single registry query, one connections listing and one secret scope listing.
+With --all, the whole registry is audited as a DataFrame and only APIs with
+issues are reported.
 """
 
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import logging
 import sys
 import os
-from databricks.sdk import WorkspaceClient
+import string
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING
+from urllib.parse import urlparse
+
+# The SDK pulls in a large dependency tree, so it is imported where it is
+# used rather than at module import time.
+if TYPE_CHECKING:
+    from databricks.sdk import WorkspaceClient
+    from databricks.sdk.service.catalog import ConnectionInfo
+
+
+logger = logging.getLogger(__name__)
+
+# Registry lookup; api_id is bound as a named parameter so the statement text
+# stays constant across invocations. Rows are unpacked positionally, so keep
+# the column order in sync with debug_api and debug_apis_bulk.
+REGISTRY_SELECT = """
+    SELECT 
+        api_id,
+        api_name,
+        connection_name,
+        host,
+        base_path,
+        api_path,
+        auth_type,
+        secret_scope,
+        http_method,
+        status
+    FROM {table_name}
+"""
+REGISTRY_QUERY = REGISTRY_SELECT + "    WHERE api_id = :api_id\n"
+BULK_REGISTRY_QUERY = REGISTRY_SELECT + "    WHERE api_id IN ({placeholders})\n"
+BULK_PARAMETER_LIMIT = 256  # named parameters per statement
+REGISTRY_COLUMNS = [
+    'api_id', 'api_name', 'connection_name', 'host', 'base_path',
+    'api_path', 'auth_type', 'secret_scope', 'http_method', 'status'
+]
+
+BANNER = "=" * 80
+
+# Boolean issue columns computed by audit_registry, with their descriptions
+AUDIT_ISSUES = {
+    'missing_connection': "Connection not found",
+    'api_key_with_bearer_token': "Connection has non-empty bearer_token for api_key auth",
+    'bearer_token_not_secret': "Connection doesn't reference secret for bearer_token auth",
+    'public_with_bearer_token': "Connection has non-empty bearer_token for public API",
+    'missing_secret_scope': "Secret scope doesn't exist",
+}
+
+# Test SQL printed in Step 5, keyed by auth_type
+SQL_TEMPLATES: dict[str, string.Template] = {
+    'none': string.Template("""SELECT http_request(
+  conn => '$conn',
+  method => '$method',
+  path => '$path',
+  headers => map('Accept', 'application/json')
+);"""),
+    'api_key': string.Template("""SELECT http_request(
+  conn => '$conn',
+  method => '$method',
+  path => '$path',
+  params => map(
+    'api_key', secret('$scope', 'api_key'),
+    -- Add your parameters here
+    'param1', 'value1'
+  ),
+  headers => map('Accept', 'application/json')
+);"""),
+    'bearer_token': string.Template("""SELECT http_request(
+  conn => '$conn',
+  method => '$method',
+  path => '$path',
+  params => map(
+    -- Add your parameters here
+    'param1', 'value1'
+  ),
+  headers => map('Accept', 'application/json')
+);"""),
+}
+
+STATEMENT_POLL_INTERVAL = 0.1  # seconds between get_statement polls
+STATEMENT_TIMEOUT = 30  # seconds before giving up and cancelling
+TERMINAL_STATES = {'SUCCEEDED', 'FAILED', 'CANCELED', 'CLOSED'}  # StatementState values
+
+CACHE_DIR = Path.home() / '.cache' / 'mcp_api_registry'
+CONNECTION_CACHE_TTL = 300  # seconds
+
+
+@lru_cache(maxsize=1)
+def get_client(profile: str | None = None) -> WorkspaceClient:
+    """Build the workspace client once per process; an explicit profile skips auth detection."""
+    from databricks.sdk import WorkspaceClient
+    
+    return WorkspaceClient(profile=profile) if profile else WorkspaceClient()
+
+
+def get_connection(
+    w: WorkspaceClient,
+    catalog: str,
+    schema: str,
+    connection_name: str,
+    use_cache: bool = False
+) -> tuple[ConnectionInfo, bool]:
+    """Fetch connection metadata.
+
+    Returns (connection, from_cache). With use_cache, an on-disk copy younger
+    than CONNECTION_CACHE_TTL is reused; the cache is keyed by workspace host so
+    profiles pointing at different workspaces never share entries.
+    """
+    from databricks.sdk.service.catalog import ConnectionInfo
+    
+    full_connection_name = f'{catalog}.{schema}.{connection_name}'
+    if not use_cache:
+        return w.connections.get(full_connection_name), False
+    
+    workspace = urlparse(w.config.host or '').netloc or 'default'
+    cache_dir = CACHE_DIR / workspace
+    cache_file = cache_dir / f'{full_connection_name}.json'
+    
+    try:
+        if time.time() - cache_file.stat().st_mtime < CONNECTION_CACHE_TTL:
+            return ConnectionInfo.from_dict(json.loads(cache_file.read_text())), True
+    except (OSError, ValueError):
+        pass
+    
+    conn = w.connections.get(full_connection_name)
+    
+    try:
+        # Connection options can carry credentials, so keep the cache private
+        cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        cache_file.write_text(json.dumps(conn.as_dict()))
+    except OSError:
+        pass  # Caching is best-effort
+    
+    return conn, False
+
+
+def run_statement(w: WorkspaceClient, warehouse_id: str, statement: str, parameters=None):
+    """Submit a statement without blocking and poll until it reaches a terminal state."""
+    from databricks.sdk.service.sql import Disposition, ExecuteStatementRequestOnWaitTimeout, Format
+    
+    response = w.statement_execution.execute_statement(
+        warehouse_id=warehouse_id,
+        statement=statement,
+        parameters=parameters,
+        wait_timeout='0s',
+        on_wait_timeout=ExecuteStatementRequestOnWaitTimeout.CONTINUE,
+        disposition=Disposition.INLINE,
+        format=Format.JSON_ARRAY
+    )
+    
+    deadline = time.monotonic() + STATEMENT_TIMEOUT
+    while response.status.state.value not in TERMINAL_STATES:
+        if time.monotonic() > deadline:
+            w.statement_execution.cancel_execution(response.statement_id)
+            raise TimeoutError(f"Statement did not finish within {STATEMENT_TIMEOUT}s")
+        time.sleep(STATEMENT_POLL_INTERVAL)
+        response = w.statement_execution.get_statement(response.statement_id)
+    
+    if response.status.state.value != 'SUCCEEDED':
+        status = response.status
+        error = status.error.message if status.error else status.state.value
+        raise RuntimeError(f"Statement {response.status.state.value}: {error}")
+    
+    return response
+
+
+def fetch_rows(w: WorkspaceClient, response) -> list[list]:
+    """Collect every row of a finished statement, following inline result chunks."""
+    if not response.result:
+        return []
+    
+    rows = list(response.result.data_array or [])
+    next_chunk = response.result.next_chunk_index
+    while next_chunk is not None:
+        chunk = w.statement_execution.get_statement_result_chunk_n(
+            response.statement_id, next_chunk
+        )
+        rows.extend(chunk.data_array or [])
+        next_chunk = chunk.next_chunk_index
+    
+    return rows
+
+
+def check_secret(
+    w: WorkspaceClient,
+    scope: str,
+    key: str,
+    diagnose: bool = False
+) -> tuple[bool, set[str] | None]:
+    """Check whether key exists in scope using secret metadata only.
+
+    Returns (found, available_keys); available_keys is only collected with
+    diagnose and is None otherwise. Raises NotFound if the scope is missing.
+    """
+    if diagnose:
+        keys = {secret.key for secret in w.secrets.list_secrets(scope=scope)}
+        return key in keys, keys
+    
+    # get_secret only works from notebooks and would fetch the value, so list
+    # the keys and stop comparing at the first match
+    return any(secret.key == key for secret in w.secrets.list_secrets(scope=scope)), None
+
+
+def is_secret_ref(value) -> bool:
+    """Whether a connection option holds a secret('scope', 'key') reference."""
+    return isinstance(value, str) and value.startswith('secret(')
+
+
+def find_issues(auth_type: str, bearer_token: str) -> list[str]:
+    """Check a connection's bearer_token option against what auth_type requires."""
+    issues = []
+    
+    if auth_type == 'api_key':
+        if bearer_token != '':
+            issues.append("Connection has non-empty bearer_token for api_key auth")
+    elif auth_type == 'bearer_token':
+        if not is_secret_ref(bearer_token):
+            issues.append("Connection doesn't reference secret for bearer_token auth")
+    elif auth_type == 'none':
+        if bearer_token != '':
+            issues.append(
+                "Connection has non-empty bearer_token for public API (should be empty string)"
+            )
+    
+    return issues
+
 
+def flush(out: io.StringIO):
+    """Write buffered report output to stdout in a single call and reset the buffer."""
+    sys.stdout.write(out.getvalue())
+    sys.stdout.flush()
+    out.seek(0)
+    out.truncate()
 
-def debug_api(api_id: str, warehouse_id: str, catalog: str, schema: str):
+
+def debug_api(
+    api_id: str,
+    warehouse_id: str,
+    catalog: str,
+    schema: str,
+    profile: str | None = None,
+    diagnose: bool = False,
+    use_cache: bool = False
+):
     """Debug an API registration."""
     
-    print("\n" + "="*80)
-    print("🔍 API Authentication Debugger")
-    print("="*80 + "\n")
+    # Report lines are buffered and written once per section rather than per line
+    out = io.StringIO()
+    try:
+        _debug_api(api_id, warehouse_id, catalog, schema, profile, diagnose, use_cache, out)
+    finally:
+        flush(out)
+
+
+def _debug_api(
+    api_id: str,
+    warehouse_id: str,
+    catalog: str,
+    schema: str,
+    profile: str | None,
+    diagnose: bool,
+    use_cache: bool,
+    out: io.StringIO
+):
+    """Run the debug steps, writing the report into out."""
+    from databricks.sdk.errors import DatabricksError, NotFound, PermissionDenied
+    from databricks.sdk.service.sql import StatementParameterListItem
+    
+    print("\n" + BANNER, file=out)
+    print("🔍 API Authentication Debugger", file=out)
+    print(BANNER + "\n", file=out)
     
     # Initialize workspace client
-    w = WorkspaceClient()
+    w = get_client(profile)
     
     # Step 1: Check if API exists in registry
-    print("📊 Step 1: Checking API registry...")
+    print("📊 Step 1: Checking API registry...", file=out)
     table_name = f'{catalog}.{schema}.api_http_registry'
-    query = f"""
-        SELECT 
-            api_id,
-            api_name,
-            connection_name,
-            host,
-            base_path,
-            api_path,
-            auth_type,
-            secret_scope,
-            http_method,
-            status
-        FROM {table_name}
-        WHERE api_id = '{api_id}'
-    """
+    query = REGISTRY_QUERY.format(table_name=table_name)
+    flush(out)
     
     try:
-        result = w.statement_execution.execute_statement(
-            warehouse_id=warehouse_id,
-            statement=query,
-            wait_timeout='30s'
+        result = run_statement(
+            w,
+            warehouse_id,
+            query,
+            parameters=[StatementParameterListItem(name='api_id', value=api_id, type='STRING')]
         )
         
-        if not result.result or not result.result.data_array or len(result.result.data_array) == 0:
-            print(f"❌ API with id '{api_id}' not found in registry!")
-            print(f"   Table: {table_name}")
+        # JSON_ARRAY rows are read positionally; the manifest is never consulted
+        rows = result.result.data_array if result.result else None
+        if not rows:
+            print(f"❌ API with id '{api_id}' not found in registry!", file=out)
+            print(f"   Table: {table_name}", file=out)
             return
         
-        # Parse the result
-        columns = [col.name for col in result.manifest.schema.columns]
-        row = result.result.data_array[0]
-        api_data = {columns[i]: row[i] for i in range(len(columns))}
-        
-        print("✅ API found in registry:")
-        print(f"   Name: {api_data.get('api_name')}")
-        print(f"   Connection: {api_data.get('connection_name')}")
-        print(f"   Auth Type: {api_data.get('auth_type')}")
-        print(f"   Secret Scope: {api_data.get('secret_scope') or 'None'}")
-        print(f"   Status: {api_data.get('status')}")
-        print(f"   Endpoint: {api_data.get('host')}{api_data.get('base_path') or ''}{api_data.get('api_path')}")
+        # Parse the result; column order matches the SELECT list in REGISTRY_QUERY
+        (_, api_name, connection_name, host, base_path, api_path,
+         auth_type, secret_scope, http_method, status) = rows[0]
         
-        connection_name = api_data.get('connection_name')
-        auth_type = api_data.get('auth_type')
-        secret_scope = api_data.get('secret_scope')
+        print("✅ API found in registry:", file=out)
+        print(f"   Name: {api_name}", file=out)
+        print(f"   Connection: {connection_name}", file=out)
+        print(f"   Auth Type: {auth_type}", file=out)
+        print(f"   Secret Scope: {secret_scope or 'None'}", file=out)
+        print(f"   Status: {status}", file=out)
+        print(f"   Endpoint: {host}{base_path or ''}{api_path}", file=out)
         
+    except (DatabricksError, RuntimeError, TimeoutError) as e:
+        print(f"❌ Error querying registry: {str(e)}", file=out)
+        return
     except Exception as e:
-        print(f"❌ Error querying registry: {str(e)}")
+        logger.debug("Unexpected error querying registry", exc_info=True)
+        print(f"❌ Unexpected error querying registry: {str(e)}", file=out)
         return
     
-    # Step 2: Check if connection exists
-    print(f"\n🔌 Step 2: Checking UC HTTP Connection...")
     full_connection_name = f"{catalog}.{schema}.{connection_name}"
+    needs_secrets = bool(secret_scope) and auth_type in ['api_key', 'bearer_token']
+    expected_key = 'bearer_token' if auth_type == 'bearer_token' else 'api_key'
+    
+    # Steps 2 and 3 are independent REST calls; issue them together and join
+    # before printing so their latencies overlap.
+    flush(out)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        # Fetched over REST rather than folded into the registry statement:
+        # information_schema.connections has no options column, and the
+        # bearer_token check below needs conn.options.
+        fut_conn = executor.submit(get_connection, w, catalog, schema, connection_name, use_cache)
+        fut_secrets = executor.submit(
+            lambda: (
+                check_secret(w, secret_scope, expected_key, diagnose)
+                if needs_secrets else (False, None)
+            )
+        )
+    
+    # Step 2: Check if connection exists
+    print(f"\n🔌 Step 2: Checking UC HTTP Connection...", file=out)
     
     try:
-        # Try to get the connection
-        conn = w.connections.get(full_connection_name)
-        print(f"✅ Connection exists: {full_connection_name}")
-        print(f"   Host: {conn.options.get('host') if conn.options else 'N/A'}")
-        print(f"   Base Path: {conn.options.get('base_path') if conn.options else 'N/A'}")
-        print(f"   Owner: {conn.owner}")
+        conn, from_cache = fut_conn.result()
+        options = conn.options or {}
+        bearer_token = options.get('bearer_token', 'NOT_SET')
+        cached_note = f" (cached, up to {CONNECTION_CACHE_TTL}s old)" if from_cache else ""
+        print(f"✅ Connection exists: {full_connection_name}{cached_note}", file=out)
+        print(f"   Host: {options.get('host', 'N/A')}", file=out)
+        print(f"   Base Path: {options.get('base_path', 'N/A')}", file=out)
+        print(f"   Owner: {conn.owner}", file=out)
         
         # Check bearer_token configuration
-        if conn.options:
-            bearer_token = conn.options.get('bearer_token', 'NOT_SET')
+        if options:
             if bearer_token == '':
-                print(f"   Bearer Token: EMPTY ✅ (correct for api_key or none auth)")
-            elif 'secret(' in str(bearer_token):
-                print(f"   Bearer Token: SECRET REFERENCE ✅ (correct for bearer_token auth)")
+                print(f"   Bearer Token: EMPTY ✅ (correct for api_key or none auth)", file=out)
+            elif is_secret_ref(bearer_token):
+                print(
+                    f"   Bearer Token: SECRET REFERENCE ✅ (correct for bearer_token auth)",
+                    file=out
+                )
             else:
-                print(f"   Bearer Token: {bearer_token}")
+                print(f"   Bearer Token: {bearer_token}", file=out)
         
+    except NotFound as e:
+        print(f"❌ Connection not found: {str(e)}", file=out)
+        print(f"   Expected name: {full_connection_name}", file=out)
+        return
+    except PermissionDenied as e:
+        print(f"❌ No permission to read connection: {str(e)}", file=out)
+        print(f"   Ask the owner to grant USE CONNECTION on {full_connection_name}", file=out)
+        return
     except Exception as e:
-        print(f"❌ Connection not found or error: {str(e)}")
-        print(f"   Expected name: {full_connection_name}")
+        logger.debug("Unexpected error fetching connection", exc_info=True)
+        print(f"❌ Error fetching connection: {str(e)}", file=out)
+        print(f"   Expected name: {full_connection_name}", file=out)
         return
     
     # Step 3: Check secrets (if applicable)
-    if secret_scope and auth_type in ['api_key', 'bearer_token']:
-        print(f"\n🔐 Step 3: Checking secret scope...")
+    if needs_secrets:
+        print(f"\n🔐 Step 3: Checking secret scope...", file=out)
         
         try:
-            # List secrets in the scope
-            secrets = list(w.secrets.list_secrets(scope=secret_scope))
-            print(f"✅ Secret scope exists: {secret_scope}")
-            print(f"   Number of secrets: {len(secrets)}")
-            
             # Check for the expected secret key
-            expected_key = 'bearer_token' if auth_type == 'bearer_token' else 'api_key'
-            secret_keys = [s.key for s in secrets]
+            found, secret_keys = fut_secrets.result()
+            
+            print(f"✅ Secret scope exists: {secret_scope}", file=out)
+            if secret_keys is not None:
+                print(f"   Number of secrets: {len(secret_keys)}", file=out)
             
-            if expected_key in secret_keys:
-                print(f"   ✅ Expected secret key '{expected_key}' found")
+            if found:
+                print(
+                    f"   ✅ Expected secret key '{expected_key}' found in scope '{secret_scope}'",
+                    file=out
+                )
             else:
-                print(f"   ❌ Expected secret key '{expected_key}' NOT FOUND")
-                print(f"   Available keys: {secret_keys}")
+                print(
+                    f"   ❌ Expected secret key '{expected_key}' NOT FOUND "
+                    f"in scope '{secret_scope}'",
+                    file=out
+                )
+                if secret_keys is not None:
+                    print(f"   Available keys: {sorted(secret_keys)}", file=out)
+                else:
+                    print(
+                        "   Re-run with --diagnose to list the keys available in the scope",
+                        file=out
+                    )
                 
+        except NotFound:
+            print(f"❌ The secret scope '{secret_scope}' doesn't exist!", file=out)
+            print(f"   Create it with: databricks secrets create-scope {secret_scope}", file=out)
+        except PermissionDenied as e:
+            print(f"❌ No permission to read secret scope '{secret_scope}': {str(e)}", file=out)
         except Exception as e:
-            print(f"❌ Error accessing secret scope: {str(e)}")
-            if "does not exist" in str(e).lower():
-                print(f"   The secret scope '{secret_scope}' doesn't exist!")
-                print(f"   Create it with: databricks secrets create-scope {secret_scope}")
+            logger.debug("Unexpected error accessing secret scope", exc_info=True)
+            print(f"❌ Error accessing secret scope: {str(e)}", file=out)
     else:
-        print(f"\n🔐 Step 3: Secret scope not needed (auth_type={auth_type})")
+        print(f"\n🔐 Step 3: Secret scope not needed (auth_type={auth_type})", file=out)
     
     # Step 4: Test connection (optional - requires serving endpoints API)
-    print(f"\n🧪 Step 4: Testing connection...")
-    print(f"   (Skipping - would require serving endpoints API)")
+    print(f"\n🧪 Step 4: Testing connection...", file=out)
+    print(f"   (Skipping - would require serving endpoints API)", file=out)
     
     # Step 5: Generate test SQL
-    print(f"\n📝 Step 5: Generated test SQL:")
-    print(f"\n```sql")
-    
-    if auth_type == 'none':
-        print(f"""SELECT http_request(
-  conn => '{full_connection_name}',
-  method => '{api_data.get('http_method')}',
-  path => '{api_data.get('api_path')}',
-  headers => map('Accept', 'application/json')
-);""")
-    elif auth_type == 'api_key':
-        print(f"""SELECT http_request(
-  conn => '{full_connection_name}',
-  method => '{api_data.get('http_method')}',
-  path => '{api_data.get('api_path')}',
-  params => map(
-    'api_key', secret('{secret_scope}', 'api_key'),
-    -- Add your parameters here
-    'param1', 'value1'
-  ),
-  headers => map('Accept', 'application/json')
-);""")
-    elif auth_type == 'bearer_token':
-        print(f"""SELECT http_request(
-  conn => '{full_connection_name}',
-  method => '{api_data.get('http_method')}',
-  path => '{api_data.get('api_path')}',
-  params => map(
-    -- Add your parameters here
-    'param1', 'value1'
-  ),
-  headers => map('Accept', 'application/json')
-);""")
+    print(f"\n📝 Step 5: Generated test SQL:", file=out)
+    print(f"\n```sql", file=out)
     
-    print(f"```\n")
+    template = SQL_TEMPLATES.get(auth_type)
+    if template:
+        print(template.substitute(
+            conn=full_connection_name, method=http_method, path=api_path, scope=secret_scope
+        ), file=out)
     
-    # Summary
-    print("="*80)
-    print("📋 Summary")
-    print("="*80)
+    print(f"```\n", file=out)
     
-    issues = []
+    # Summary
+    print(BANNER, file=out)
+    print("📋 Summary", file=out)
+    print(BANNER, file=out)
     
     if auth_type == 'api_key':
-        print("\n✅ For API key auth, connection should have:")
-        print("   - bearer_token: EMPTY string")
-        print("   - Secret scope with key 'api_key'")
-        print("   - API key passed in params at runtime")
-        
-        if bearer_token != '':
-            issues.append("Connection has non-empty bearer_token for api_key auth")
-            
+        print("\n✅ For API key auth, connection should have:", file=out)
+        print("   - bearer_token: EMPTY string", file=out)
+        print("   - Secret scope with key 'api_key'", file=out)
+        print("   - API key passed in params at runtime", file=out)
     elif auth_type == 'bearer_token':
-        print("\n✅ For bearer token auth, connection should have:")
-        print("   - bearer_token: secret reference")
-        print("   - Secret scope with key 'bearer_token'")
-        print("   - Token automatically included in Authorization header")
-        
-        if 'secret(' not in str(bearer_token):
-            issues.append("Connection doesn't reference secret for bearer_token auth")
-            
+        print("\n✅ For bearer token auth, connection should have:", file=out)
+        print("   - bearer_token: secret reference", file=out)
+        print("   - Secret scope with key 'bearer_token'", file=out)
+        print("   - Token automatically included in Authorization header", file=out)
     elif auth_type == 'none':
-        print("\n✅ For public APIs, connection should have:")
-        print("   - bearer_token: EMPTY string")
-        print("   - No secret scope needed")
-        
-        if bearer_token != '':
-            issues.append("Connection has non-empty bearer_token for public API (should be empty string)")
+        print("\n✅ For public APIs, connection should have:", file=out)
+        print("   - bearer_token: EMPTY string", file=out)
+        print("   - No secret scope needed", file=out)
     
+    issues = find_issues(auth_type, bearer_token)
     if issues:
-        print("\n⚠️  Potential Issues Found:")
+        print("\n⚠️  Potential Issues Found:", file=out)
         for issue in issues:
-            print(f"   - {issue}")
+            print(f"   - {issue}", file=out)
     else:
-        print("\n✅ Configuration looks correct!")
+        print("\n✅ Configuration looks correct!", file=out)
     
-    print("\n" + "="*80 + "\n")
+    print("\n" + BANNER + "\n", file=out)
 
 
-if __name__ == "__main__":
-    if len(sys.argv) != 5:
-        print("Usage: python debug_api_auth.py <api_id> <warehouse_id> <catalog> <schema>")
-        print("\nExample:")
-        print("  python debug_api_auth.py abc-123 your-warehouse-id my_catalog my_schema")
-        sys.exit(1)
+def debug_apis_bulk(
+    api_ids: list[str],
+    warehouse_id: str,
+    catalog: str,
+    schema: str,
+    profile: str | None = None
+):
+    """Debug many API registrations with one round trip per resource type."""
+    
+    out = io.StringIO()
+    try:
+        _debug_apis_bulk(api_ids, warehouse_id, catalog, schema, profile, out)
+    finally:
+        flush(out)
+
+
+def _debug_apis_bulk(
+    api_ids: list[str],
+    warehouse_id: str,
+    catalog: str,
+    schema: str,
+    profile: str | None,
+    out: io.StringIO
+):
+    """Fetch registry rows, connections and secret scopes in bulk and report per API."""
+    from databricks.sdk.errors import DatabricksError
+    from databricks.sdk.service.sql import StatementParameterListItem
+    
+    print("\n" + BANNER, file=out)
+    print(f"🔍 API Authentication Debugger (bulk: {len(api_ids)} APIs)", file=out)
+    print(BANNER + "\n", file=out)
+    flush(out)
+    
+    w = get_client(profile)
+    table_name = f'{catalog}.{schema}.api_http_registry'
+    
+    # Connections and scopes don't depend on the registry rows, so list them
+    # while the registry chunks run on the warehouse.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        fut_connections = executor.submit(lambda: list(w.connections.list()))
+        fut_scopes = executor.submit(lambda: {s.name for s in w.secrets.list_scopes()})
+        
+        rows = {}
+        try:
+            for start in range(0, len(api_ids), BULK_PARAMETER_LIMIT):
+                chunk = api_ids[start:start + BULK_PARAMETER_LIMIT]
+                parameters = [
+                    StatementParameterListItem(name=f'id{i}', value=api_id, type='STRING')
+                    for i, api_id in enumerate(chunk)
+                ]
+                query = BULK_REGISTRY_QUERY.format(
+                    table_name=table_name,
+                    placeholders=', '.join(f':{p.name}' for p in parameters)
+                )
+                result = run_statement(w, warehouse_id, query, parameters=parameters)
+                for row in fetch_rows(w, result):
+                    rows[row[0]] = row
+        except (DatabricksError, RuntimeError, TimeoutError) as e:
+            print(f"❌ Error querying registry: {str(e)}", file=out)
+            return
+        except Exception as e:
+            logger.debug("Unexpected error querying registry", exc_info=True)
+            print(f"❌ Unexpected error querying registry: {str(e)}", file=out)
+            return
+        
+        try:
+            # Matched by full name only, the same name debug_api passes to connections.get
+            connections = {conn.full_name: conn for conn in fut_connections.result()}
+            scopes = fut_scopes.result()
+        except DatabricksError as e:
+            print(f"❌ Error listing connections or secret scopes: {str(e)}", file=out)
+            return
+        except Exception as e:
+            logger.debug("Unexpected error listing connections or secret scopes", exc_info=True)
+            print(f"❌ Unexpected error listing connections or secret scopes: {str(e)}", file=out)
+            return
+    
+    problem_count = 0
+    for api_id in api_ids:
+        row = rows.get(api_id)
+        if row is None:
+            print(f"❌ {api_id}: not found in {table_name}", file=out)
+            problem_count += 1
+            continue
+        
+        (_, api_name, connection_name, host, base_path, api_path,
+         auth_type, secret_scope, http_method, status) = row
+        full_connection_name = f"{catalog}.{schema}.{connection_name}"
+        
+        issues = []
+        conn = connections.get(full_connection_name)
+        if conn is None:
+            issues.append(f"Connection not found: {full_connection_name}")
+        else:
+            options = conn.options or {}
+            issues.extend(find_issues(auth_type, options.get('bearer_token', 'NOT_SET')))
+        
+        if auth_type in ['api_key', 'bearer_token'] and secret_scope and secret_scope not in scopes:
+            issues.append(f"Secret scope '{secret_scope}' doesn't exist")
+        
+        marker = '⚠️ ' if issues else '✅'
+        print(
+            f"{marker} {api_id} ({api_name}) - auth_type={auth_type}, connection={connection_name}",
+            file=out
+        )
+        for issue in issues:
+            print(f"   - {issue}", file=out)
+        if issues:
+            problem_count += 1
+    
+    print("\n" + BANNER, file=out)
+    print(f"📋 Summary: {len(api_ids) - problem_count}/{len(api_ids)} APIs look correct", file=out)
+    print(BANNER + "\n", file=out)
+
+
+def audit_registry(warehouse_id: str, catalog: str, schema: str, profile: str | None = None):
+    """Check every registered API at once; returns a DataFrame with a boolean column per issue."""
+    # pandas is only needed for the audit, so keep it off the single-API path
+    import pandas as pd
+    
+    w = get_client(profile)
+    table_name = f'{catalog}.{schema}.api_http_registry'
+    
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        fut_connections = executor.submit(lambda: list(w.connections.list()))
+        fut_scopes = executor.submit(lambda: {s.name for s in w.secrets.list_scopes()})
+        
+        result = run_statement(w, warehouse_id, REGISTRY_SELECT.format(table_name=table_name))
+        df = pd.DataFrame(fetch_rows(w, result), columns=REGISTRY_COLUMNS)
+        connections = fut_connections.result()
+        scopes = fut_scopes.result()
+    
+    # bearer_token option per connection, matched by full name as in debug_api
+    bearer_tokens = {
+        conn.full_name: (conn.options or {}).get('bearer_token', 'NOT_SET') for conn in connections
+    }
+    
+    full_names = f'{catalog}.{schema}.' + df['connection_name'].fillna('')
+    bearer_token = full_names.map(bearer_tokens).astype(object)
+    connection_found = bearer_token.notna()
+    token_empty = bearer_token == ''
+    token_is_secret = bearer_token.str.startswith('secret(', na=False)
+    needs_secret = df['auth_type'].isin(['api_key', 'bearer_token'])
+    has_scope = df['secret_scope'].fillna('') != ''
+    
+    auth_type = df['auth_type']
+    
+    df['missing_connection'] = ~connection_found
+    df['api_key_with_bearer_token'] = connection_found & (auth_type == 'api_key') & ~token_empty
+    df['bearer_token_not_secret'] = (
+        connection_found & (auth_type == 'bearer_token') & ~token_is_secret
+    )
+    df['public_with_bearer_token'] = connection_found & (auth_type == 'none') & ~token_empty
+    df['missing_secret_scope'] = needs_secret & has_scope & ~df['secret_scope'].isin(scopes)
     
-    api_id = sys.argv[1]
-    warehouse_id = sys.argv[2]
-    catalog = sys.argv[3]
-    schema = sys.argv[4]
+    return df
+
+
+def print_audit(df):
+    """Print issue counts and the APIs that have at least one issue."""
+    issue_columns = list(AUDIT_ISSUES)
+    flagged = df[df[issue_columns].any(axis=1)]
+    
+    out = io.StringIO()
+    print("\n" + BANNER, file=out)
+    print(f"🔍 API Registry Audit: {len(df)} APIs, {len(flagged)} with issues", file=out)
+    print(BANNER + "\n", file=out)
+    
+    for column, description in AUDIT_ISSUES.items():
+        print(f"   {int(df[column].sum()):>5}  {description}", file=out)
+    
+    if len(flagged):
+        print("\n⚠️  APIs with issues:", file=out)
+        columns = ['api_id', 'api_name', 'auth_type', 'connection_name'] + issue_columns
+        print(flagged[columns].to_string(index=False), file=out)
+    else:
+        print("\n✅ All registered APIs look correct!", file=out)
     
-    debug_api(api_id, warehouse_id, catalog, schema)
+    print("\n" + BANNER + "\n", file=out)
+    flush(out)
 
+
+def audit_api_registry(warehouse_id: str, catalog: str, schema: str, profile: str | None = None):
+    """Audit the whole registry and print the report, or the error that stopped it."""
+    from databricks.sdk.errors import DatabricksError
+    
+    try:
+        df = audit_registry(warehouse_id, catalog, schema, profile=profile)
+    except (DatabricksError, RuntimeError, TimeoutError) as e:
+        print(f"❌ Error auditing registry: {str(e)}")
+        return
+    except Exception as e:
+        logger.debug("Unexpected error auditing registry", exc_info=True)
+        print(f"❌ Unexpected error auditing registry: {str(e)}")
+        return
+    
+    print_audit(df)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Debug API authentication issues in the MCP API Registry.",
+        epilog=(
+            "Examples:\n"
+            "  python debug_api_auth.py abc-123 your-warehouse-id my_catalog my_schema\n"
+            "  python debug_api_auth.py --ids-file ids.txt your-warehouse-id my_catalog my_schema\n"
+            "  python debug_api_auth.py --all your-warehouse-id my_catalog my_schema"
+        ),
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        'api_id', nargs='?', help='API to debug (required unless --ids-file or --all)'
+    )
+    parser.add_argument('warehouse_id')
+    parser.add_argument('catalog')
+    parser.add_argument('schema')
+    parser.add_argument('--profile', help='Databricks config profile to authenticate with')
+    parser.add_argument(
+        '--diagnose',
+        action='store_true',
+        help='List every key in the secret scope instead of checking only the expected one'
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--ids-file', help='File with one api_id per line to debug in bulk')
+    mode.add_argument('--all', action='store_true', help='Audit every API in the registry')
+    parser.add_argument(
+        '--verbose',
+        action='store_true',
+        help='Show debug logging, including tracebacks for unexpected errors'
+    )
+    parser.add_argument(
+        '--cache',
+        action='store_true',
+        help=f'Reuse connection metadata fetched in the last {CONNECTION_CACHE_TTL}s'
+    )
+    # Intermixed parsing collects options first, so positionals keep their
+    # meaning even with options in between (e.g. abc wh --profile p cat sch)
+    args = parser.parse_intermixed_args()
+    
+    if args.verbose:
+        # Only this script's logger goes to DEBUG; the SDK's own debug output stays off
+        logging.basicConfig(format='%(levelname)s %(name)s: %(message)s')
+        logger.setLevel(logging.DEBUG)
+    
+    bulk_flag = '--ids-file' if args.ids_file else '--all' if args.all else None
+    if bulk_flag:
+        if args.api_id:
+            parser.error(f"api_id cannot be combined with {bulk_flag}")
+        if args.diagnose:
+            parser.error(f"--diagnose only applies to a single api_id, not {bulk_flag}")
+        if args.cache:
+            parser.error(f"--cache only applies to a single api_id, not {bulk_flag}")
+    elif not args.api_id:
+        parser.error("an api_id, --ids-file or --all is required")
+    
+    if args.all:
+        audit_api_registry(args.warehouse_id, args.catalog, args.schema, profile=args.profile)
+    elif args.ids_file:
+        with open(args.ids_file) as f:
+            api_ids = list(dict.fromkeys(line.strip() for line in f if line.strip()))
+        debug_apis_bulk(api_ids, args.warehouse_id, args.catalog, args.schema, profile=args.profile)
+    else:
+        debug_api(
+            args.api_id,
+            args.warehouse_id,
+            args.catalog,
+            args.schema,
+            profile=args.profile,
+            diagnose=args.diagnose,
+            use_cache=args.cache
+        )